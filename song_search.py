@@ -1,35 +1,95 @@
 import os
 import csv
+import numpy as np
 import pandas as pd
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+except ImportError:
+    pa = pacsv = None
 from whoosh.fields import Schema, TEXT, ID, NUMERIC
-from whoosh.analysis import StemmingAnalyzer, StandardAnalyzer
-from whoosh import index
+from whoosh.analysis import StemmingAnalyzer
+from whoosh import index, scoring
+from whoosh.filedb.filestore import copy_to_ram
 from whoosh.qparser import MultifieldParser, QueryParser
 from whoosh.query import And, Or
 import streamlit as st
 import shutil
 from datetime import datetime
 import re
+import multiprocessing
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict, defaultdict
+from itertools import chain
+from concurrent.futures import ProcessPoolExecutor
+
+_WS_RE = re.compile(r'\s+')
+
+def _normalize_column(values):
+    """Fast equivalent of SongSearchEngine.normalize over a whole column"""
+    # str.split() collapses whitespace in a single C loop, no regex needed
+    join = ' '.join
+    return [join(text.lower().split()) for text in values]
 
 class SongSearchEngine:
-    def __init__(self, csv_file="song.csv", index_dir="indexdir"):
+    REQUIRED_COLUMNS = ['song_id', 'title', 'artist', 'lyrics']
+    RESULT_CACHE_SIZE = 256
+    RESULT_CACHE_TTL = 60  # seconds
+    QUERY_CACHE_SIZE = 256
+    # Normalizing is cheap next to pickling lyrics to workers, so only very large
+    # catalogs, in large chunks, gain from the process pool
+    PARALLEL_NORMALIZE_MIN = 500000  # songs
+    NORMALIZE_CHUNK_SIZE = 16384  # songs per worker task
+    TRIGRAM_SUGGEST_MIN = 50000  # songs
+    DEFAULT_BM25_B = 0.75
+    # Per-field BM25 length normalization at the default b; scaled along with b
+    FIELD_B = {'title': 0.7, 'lyrics': 0.9}
+    
+    def __init__(self, csv_file="song.csv", index_dir="indexdir", in_memory=False, lyrics_db=None):
         self.csv_file = csv_file
         self.index_dir = index_dir
+        self.in_memory = in_memory
+        # Lyrics live compressed in a SQLite sidecar next to the CSV
+        self.lyrics_db = lyrics_db or os.path.splitext(csv_file)[0] + ".sqlite"
+        self._conn = None
+        # Serializes sidecar reads, which run from both the script and rebuild threads
+        self._db_lock = threading.Lock()
+        # Fingerprint of the CSV as it was when the loaded rows were read
+        self._loaded_stamp = None
         self.ix = None
-        self.songs_data = []
+        self._searcher = None
+        # Guards the index and searcher while a background rebuild swaps them
+        self._lock = threading.RLock()
+        self._rebuild_thread = None
+        self.rebuild_progress = 0.0
+        self.rebuild_error = None
+        self.set_columns({col: [] for col in self.REQUIRED_COLUMNS})
+        
+        # LRU cache of search results, invalidated by bumping the epoch
+        self._cache = OrderedDict()
+        self._cache_epoch = 0
+        
+        # Query parsers per field set, and parsed queries per (fields, text)
+        self._parser_cache = {}
+        self._query_cache = OrderedDict()
+        
+        # BM25 ranking parameters
+        self.bm25_k1 = 1.5
+        self.bm25_b = self.DEFAULT_BM25_B
         
         # Initialize the search engine
         self.setup_schema()
         self.load_data()
+        self.build_suggestion_index()
         self.build_index()
     
     def normalize(self, text):
         """Normalize text for consistent searching"""
-        if not text:
-            return ""
-        # Remove extra whitespace and convert to lowercase
-        text = re.sub(r'\s+', ' ', str(text).strip().lower())
-        return text
+        # Collapse whitespace and convert to lowercase
+        return _WS_RE.sub(' ', str(text).lower()).strip() if text else ""
     
     def setup_schema(self):
         """Define the search index schema"""
@@ -40,44 +100,206 @@ class SongSearchEngine:
             song_id=ID(stored=True, unique=True),
             title=TEXT(stored=True, analyzer=analyzer, phrase=True),
             artist=TEXT(stored=True, analyzer=analyzer, phrase=True),
-            lyrics=TEXT(stored=True, analyzer=analyzer),
-            title_exact=TEXT(stored=True, analyzer=StandardAnalyzer()),
-            artist_exact=TEXT(stored=True, analyzer=StandardAnalyzer())
+            # Original lyrics are served from SQLite, so they are not stored
+            lyrics=TEXT(analyzer=analyzer)
         )
     
     def load_data(self):
         """Load songs from CSV file"""
         try:
             if os.path.exists(self.csv_file):
-                df = pd.read_csv(self.csv_file)
+                # Stamp before reading, so a later edit to the CSV is never attributed to these rows
+                stamp = self.source_stamp()
+                columns = self.read_csv_columns()
                 # Ensure all required columns exist
-                required_columns = ['song_id', 'title', 'artist', 'lyrics']
-                missing_columns = [col for col in required_columns if col not in df.columns]
+                missing_columns = [col for col in self.REQUIRED_COLUMNS if col not in columns]
                 
                 if missing_columns:
                     st.error(f"Missing required columns in CSV: {missing_columns}")
                     st.info("Required columns: song_id, title, artist, lyrics")
-                    self.songs_data = []
                     return
                 
-                self.songs_data = df.to_dict('records')
-                st.success(f"Loaded {len(self.songs_data)} songs from {self.csv_file}")
+                # Write the sidecar first, so a failure leaves the engine empty rather than half-loaded
+                self.store_lyrics(columns['song_id'], columns['lyrics'], stamp)
+                self.set_columns(columns)
+                self._loaded_stamp = stamp
+                st.success(f"Loaded {len(self.song_ids)} songs from {self.csv_file}")
             else:
                 st.error(f"CSV file '{self.csv_file}' not found!")
                 st.info("Please ensure your CSV file is in the same directory as this app.")
                 st.info("Expected format: song_id,title,artist,lyrics")
-                self.songs_data = []
         except Exception as e:
             st.error(f"Error loading data: {e}")
-            self.songs_data = []
     
-    def build_index(self):
-        """Build the search index"""
-        if not self.songs_data:
+    def read_csv_columns(self):
+        """Read the required CSV columns as arrays of strings, using pyarrow when available"""
+        if pacsv is not None:
+            # Read the header first so missing columns are reported rather than raised by pyarrow
+            with open(self.csv_file, newline='', encoding='utf-8-sig') as f:
+                header = next(csv.reader(f), [])
+            present = [col for col in self.REQUIRED_COLUMNS if col in header]
+            if not present:
+                return {}
+            
+            try:
+                # Parse in multithreaded C++ with only the required columns, typed as strings;
+                # lyrics routinely contain quoted line breaks
+                table = pacsv.read_csv(
+                    self.csv_file,
+                    parse_options=pacsv.ParseOptions(newlines_in_values=True),
+                    convert_options=pacsv.ConvertOptions(
+                        column_types={col: pa.string() for col in present},
+                        strings_can_be_null=False,
+                        include_columns=present
+                    )
+                )
+                return {col: table.column(col).to_pylist() for col in present}
+            except (TypeError, pa.ArrowNotImplementedError):
+                # Options this pyarrow release doesn't support; pandas can still read the file
+                pass
+        
+        # Read every column as plain strings to skip type inference and NaN handling
+        df = pd.read_csv(
+            self.csv_file,
+            dtype=str,
+            keep_default_na=False,
+            usecols=lambda col: col in self.REQUIRED_COLUMNS
+        )
+        return {col: df[col].to_numpy() for col in df.columns}
+    
+    def set_columns(self, columns):
+        """Expose the song columns as arrays"""
+        self.song_ids = np.asarray(columns['song_id'], dtype=object)
+        self.titles = np.asarray(columns['title'], dtype=object)
+        self.artists = np.asarray(columns['artist'], dtype=object)
+        
+        # Map song IDs to their records, keeping the first row for duplicate IDs;
+        # lyrics are kept out of memory and fetched from SQLite on demand
+        self._id_to_song = {}
+        for song_id, title, artist in zip(self.song_ids, self.titles, self.artists):
+            self._id_to_song.setdefault(song_id, {
+                'song_id': song_id,
+                'title': title,
+                'artist': artist
+            })
+    
+    def store_lyrics(self, song_ids, lyrics, stamp):
+        """Write zlib-compressed lyrics to the SQLite sidecar unless it already holds this CSV"""
+        # Streamlit reruns the script on different threads
+        conn = sqlite3.connect(self.lyrics_db, check_same_thread=False)
+        try:
+            if self.lyrics_stamp(conn) != stamp:
+                with conn:
+                    # Take the write lock, then re-check in case another session just rebuilt it
+                    conn.execute("BEGIN IMMEDIATE")
+                    if self.lyrics_stamp(conn) != stamp:
+                        conn.execute("DROP TABLE IF EXISTS songs")
+                        conn.execute("CREATE TABLE songs (row INTEGER PRIMARY KEY, song_id TEXT, lyrics BLOB)")
+                        conn.execute("CREATE INDEX songs_song_id ON songs (song_id)")
+                        conn.executemany(
+                            "INSERT INTO songs VALUES (?, ?, ?)",
+                            (
+                                (row, song_id, zlib.compress(text.encode()))
+                                for row, (song_id, text) in enumerate(zip(song_ids, lyrics))
+                            )
+                        )
+                        
+                        # Record which CSV the sidecar was built from
+                        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+                        conn.execute("INSERT OR REPLACE INTO meta VALUES ('source_stamp', ?)", (stamp,))
+        except Exception:
+            conn.close()
+            raise
+        
+        if self._conn is not None:
+            self._conn.close()
+        self._conn = conn
+    
+    def lyrics_stamp(self, conn=None):
+        """Return the CSV fingerprint the SQLite sidecar was built from, if any"""
+        if conn is None:
+            conn = self._conn
+        try:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'source_stamp'").fetchone()
+        except sqlite3.OperationalError:
+            # Sidecar is new or predates the meta table
+            return None
+        return row[0] if row else None
+    
+    def lyrics_current(self):
+        """Whether the shared sidecar still holds exactly the rows this engine loaded"""
+        # A newer session rebuilds the sidecar when it sees an edited CSV
+        if self.lyrics_stamp() != self._loaded_stamp:
+            return False
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM songs").fetchone()
+        return count == len(self.song_ids)
+    
+    def load_lyrics(self):
+        """Read all lyrics back from SQLite in CSV row order"""
+        with self._db_lock, self._conn:
+            # One read transaction, so another session can't replace the rows mid-read
+            self._conn.execute("BEGIN")
+            if not self.lyrics_current():
+                raise RuntimeError("Lyrics store was rebuilt from a newer CSV; restart the app to reload it")
+            rows = self._conn.execute("SELECT lyrics FROM songs ORDER BY row").fetchall()
+        return [zlib.decompress(blob).decode() for (blob,) in rows]
+    
+    def build_suggestion_index(self):
+        """Prepare lowercased columns for suggestions, plus a trigram index for large catalogs"""
+        self.titles_lc = np.char.lower(self.titles.astype(str))
+        self.artists_lc = np.char.lower(self.artists.astype(str))
+        self._trigram_idx = defaultdict(set)
+        if len(self.song_ids) < self.TRIGRAM_SUGGEST_MIN:
+            return
+        
+        # Map every 3-gram of the lowercased title/artist to the rows containing it
+        for idx, (title, artist) in enumerate(zip(self.titles_lc.tolist(), self.artists_lc.tolist())):
+            for text in (title, artist):
+                for i in range(len(text) - 2):
+                    self._trigram_idx[text[i:i + 3]].add(idx)
+    
+    def source_stamp(self):
+        """Fingerprint the CSV file by modification time and size"""
+        stat = os.stat(self.csv_file)
+        return f"{stat.st_mtime_ns}:{stat.st_size}"
+    
+    def open_existing_index(self, stamp_path, stamp):
+        """Open the on-disk index if it was built from the same CSV and schema"""
+        if not os.path.exists(stamp_path) or not index.exists_in(self.index_dir):
+            return False
+        with open(stamp_path) as f:
+            if f.read().strip() != stamp:
+                return False
+        
+        ix = index.open_dir(self.index_dir)
+        if ix.schema != self.schema:
+            return False
+        self.ix = ix
+        return True
+    
+    def build_index(self, optimize=False):
+        """Build the search index, reusing the existing one if it was built from the same CSV"""
+        if not len(self.song_ids):
             st.error("No data available to build index. Please check your CSV file.")
             return
+        
+        # Cached results may refer to the old index
+        self._cache_epoch += 1
             
         try:
+            stamp_path = os.path.join(self.index_dir, "source.stamp")
+            # The index holds the rows read by load_data, so it carries their stamp
+            stamp = self._loaded_stamp
+            if self.open_existing_index(stamp_path, stamp):
+                if self.in_memory:
+                    self.load_into_memory()
+                self.open_searcher()
+                st.success("Loaded existing search index.")
+                return
+            
+            # Release the old index files before removing them
+            self.close_searcher()
+            
             # Remove existing index with proper error handling
             if os.path.exists(self.index_dir):
                 try:
@@ -86,90 +308,299 @@ class SongSearchEngine:
                     # If we can't delete, try to work with existing index
                     st.warning(f"Could not delete existing index directory. Attempting to overwrite...")
                     pass
-            os.makedirs(self.index_dir, exist_ok=True)
-            
-            # Create new index
-            self.ix = index.create_in(self.index_dir, self.schema)
-            writer = self.ix.writer()
             
-            # Add documents to index
-            for song in self.songs_data:
-                writer.add_document(
-                    song_id=str(song.get("song_id", "")),
-                    title=self.normalize(song.get("title", "")),
-                    artist=self.normalize(song.get("artist", "")),
-                    lyrics=self.normalize(song.get("lyrics", "")),
-                    title_exact=str(song.get("title", "")),
-                    artist_exact=str(song.get("artist", ""))
-                )
-            
-            writer.commit()
+            self.ix = self.write_index(self.index_dir, stamp, optimize)
+            if self.in_memory:
+                self.load_into_memory()
+            self.open_searcher()
             st.success("Search index built successfully!")
             
         except Exception as e:
             st.error(f"Error building index: {e}")
     
+    def write_index(self, index_dir, stamp, optimize=False):
+        """Write all songs to a new index in index_dir and return it, updating rebuild_progress"""
+        self.rebuild_progress = 0.0
+        
+        # Normalize whole columns up front, split across processes for large catalogs
+        columns = (self.titles, self.artists, self.load_lyrics())
+        if len(self.song_ids) >= self.PARALLEL_NORMALIZE_MIN:
+            size = self.NORMALIZE_CHUNK_SIZE
+            # Never fork: Streamlit's server and the rebuild thread make this process multi-threaded
+            start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            with ProcessPoolExecutor(mp_context=multiprocessing.get_context(start_method)) as executor:
+                norm_titles, norm_artists, norm_lyrics = [
+                    list(chain.from_iterable(executor.map(
+                        _normalize_column, [col[i:i + size] for i in range(0, len(col), size)]
+                    )))
+                    for col in columns
+                ]
+        else:
+            norm_titles, norm_artists, norm_lyrics = map(_normalize_column, columns)
+        
+        os.makedirs(index_dir, exist_ok=True)
+        
+        # Create new index
+        ix = index.create_in(index_dir, self.schema)
+        # Analyze documents in parallel, with each process writing its own segment
+        writer = ix.writer(
+            procs=max(1, (os.cpu_count() or 1) - 1),
+            limitmb=512,
+            multisegment=True
+        )
+        
+        # Add documents to index
+        # Bind the method once rather than looking it up per song
+        add = writer.add_document
+        total = len(self.song_ids)
+        for done, (song_id, title, artist, lyrics) in enumerate(
+                zip(self.song_ids, norm_titles, norm_artists, norm_lyrics), 1):
+            add(song_id=song_id, title=title, artist=artist, lyrics=lyrics)
+            # Leave the last tenth of the progress bar for the commit
+            self.rebuild_progress = 0.9 * done / total
+        
+        writer.commit(optimize=False)
+        if optimize:
+            # Multisegment writers leave one segment per process; merge them
+            ix.optimize()
+        
+        # Record which CSV the index was built from
+        with open(os.path.join(index_dir, "source.stamp"), "w") as f:
+            f.write(stamp)
+        self.rebuild_progress = 1.0
+        return ix
+    
+    def rebuild_in_background(self, optimize=False):
+        """Start rebuilding the index on a background thread"""
+        if self.rebuilding() or not len(self.song_ids):
+            return
+        self.rebuild_progress = 0.0
+        self.rebuild_error = None
+        self._rebuild_thread = threading.Thread(target=self._rebuild_async, args=(optimize,), daemon=True)
+        self._rebuild_thread.start()
+    
+    def rebuilding(self):
+        """Whether a background rebuild is still running"""
+        return self._rebuild_thread is not None and self._rebuild_thread.is_alive()
+    
+    def _rebuild_async(self, optimize):
+        """Build a new index next to the live one, then swap it in"""
+        new_dir = self.index_dir + ".new"
+        old_dir = self.index_dir + ".old"
+        try:
+            shutil.rmtree(new_dir, ignore_errors=True)
+            shutil.rmtree(old_dir, ignore_errors=True)
+            # The rows being indexed are the ones load_data read, so keep their stamp
+            self.write_index(new_dir, self._loaded_stamp, optimize)
+            
+            # Directories can't be replaced in one step, so move the live index aside first;
+            # the live searcher keeps its files open and serves queries meanwhile
+            try:
+                with self._lock:
+                    if os.path.exists(self.index_dir):
+                        os.rename(self.index_dir, old_dir)
+                    os.rename(new_dir, self.index_dir)
+                
+                # Open the new index and its searcher before touching the live one
+                ix = index.open_dir(self.index_dir)
+                if self.in_memory:
+                    ix = copy_to_ram(ix.storage).open_index()
+                searcher = ix.searcher(weighting=self.weighting())
+            except Exception:
+                self._restore_live_index(old_dir)
+                raise
+            
+            with self._lock:
+                self.close_searcher()
+                self.ix, self._searcher = ix, searcher
+                self._cache_epoch += 1
+            shutil.rmtree(old_dir, ignore_errors=True)
+        except Exception as e:
+            self.rebuild_error = e
+    
+    def _restore_live_index(self, old_dir):
+        """Move the previous index back into place after a failed swap"""
+        with self._lock:
+            if not os.path.exists(old_dir):
+                return
+            if os.path.exists(self.index_dir):
+                shutil.rmtree(self.index_dir)
+            os.rename(old_dir, self.index_dir)
+    
+    def load_into_memory(self):
+        """Serve queries from a RAM copy of the on-disk index"""
+        # The disk copy stays in place so the next start can reuse it
+        self.ix = copy_to_ram(self.ix.storage).open_index()
+    
+    def open_searcher(self):
+        """Open the long-lived searcher shared by all queries"""
+        with self._lock:
+            self.close_searcher()
+            self._searcher = self.ix.searcher(weighting=self.weighting())
+    
+    def close_searcher(self):
+        """Close the shared searcher, if one is open"""
+        with self._lock:
+            if self._searcher is not None:
+                self._searcher.close()
+                self._searcher = None
+    
+    def set_bm25_params(self, k1, b):
+        """Update the BM25 ranking parameters"""
+        if (k1, b) != (self.bm25_k1, self.bm25_b):
+            self.bm25_k1 = k1
+            self.bm25_b = b
+            # Cached results were scored with the old parameters
+            self._cache_epoch += 1
+            if self._searcher is not None:
+                self.open_searcher()
+    
+    def weighting(self):
+        """Create the BM25F scorer used for searching"""
+        scale = self.bm25_b / self.DEFAULT_BM25_B
+        field_b = {f"{field}_B": min(1.0, b * scale) for field, b in self.FIELD_B.items()}
+        return scoring.BM25F(B=self.bm25_b, K1=self.bm25_k1, **field_b)
+    
     def search_songs(self, query_str, search_fields=None, top_n=10):
         """Search songs using the query string"""
-        if not self.ix or not query_str.strip():
+        if not self._searcher or not query_str.strip():
             return []
         
+        key = (self._cache_epoch, query_str, tuple(search_fields or ()), top_n)
+        cached = self._cache.get(key)
+        if cached is not None:
+            cached_at, cached_results = cached
+            if time.monotonic() - cached_at < self.RESULT_CACHE_TTL:
+                self._cache.move_to_end(key)
+                return cached_results
+            del self._cache[key]
+        
         try:
-            with self.ix.searcher() as searcher:
+            with self._lock:
+                # Pick up index changes without reopening segment readers per query
+                if not self._searcher.up_to_date():
+                    self._searcher = self._searcher.refresh()
+                searcher = self._searcher
+                
                 # Default search fields
                 if not search_fields:
                     search_fields = ["title", "artist", "lyrics"]
                 
-                # Create parser for multiple fields
-                parser = MultifieldParser(search_fields, schema=self.ix.schema)
-                
                 # Parse and execute query
-                query = parser.parse(self.normalize(query_str))
+                query = self.parse_query(query_str, search_fields)
                 results = searcher.search(query, limit=top_n)
                 
                 # Extract results with scores
                 search_results = []
                 for r in results:
+                    # Display strings come from the original rows, falling back to the
+                    # stored fields for IDs the loaded data doesn't know about
+                    song = self._id_to_song.get(r["song_id"], {})
                     search_results.append({
                         'song_id': r["song_id"],
-                        'title': r["title_exact"] if "title_exact" in r else r["title"],
-                        'artist': r["artist_exact"] if "artist_exact" in r else r["artist"],
+                        'title': song.get("title", r["title"]),
+                        'artist': song.get("artist", r["artist"]),
                         'score': r.score
                     })
                 
-                return search_results
-                
+            self._cache[key] = (time.monotonic(), search_results)
+            if len(self._cache) > self.RESULT_CACHE_SIZE:
+                self._cache.popitem(last=False)
+            return search_results
+            
         except Exception as e:
             st.error(f"Search error: {e}")
             return []
     
+    def search_many(self, queries, **kwargs):
+        """Search several queries at once, returning results in input order"""
+        # The shared searcher is not thread-safe and Whoosh scoring holds the GIL,
+        # so run each distinct query once against it
+        results = {}
+        for query_str in queries:
+            if query_str not in results:
+                results[query_str] = self.search_songs(query_str, **kwargs)
+        return [results[query_str] for query_str in queries]
+    
+    def parse_query(self, query_str, search_fields):
+        """Parse a query string, reusing previously parsed queries"""
+        fields = tuple(search_fields)
+        key = (fields, self.normalize(query_str))
+        query = self._query_cache.get(key)
+        if query is not None:
+            self._query_cache.move_to_end(key)
+            return query
+        
+        # Create parser for multiple fields
+        parser = self._parser_cache.get(fields)
+        if parser is None:
+            parser = MultifieldParser(list(fields), schema=self.ix.schema)
+            self._parser_cache[fields] = parser
+        
+        query = parser.parse(key[1])
+        self._query_cache[key] = query
+        if len(self._query_cache) > self.QUERY_CACHE_SIZE:
+            self._query_cache.popitem(last=False)
+        return query
+    
     def get_song_details(self, song_id):
         """Get full details for a specific song"""
-        for song in self.songs_data:
-            if str(song.get("song_id")) == str(song_id):
-                return song
-        return None
+        song = self._id_to_song.get(str(song_id))
+        if song is None:
+            return None
+        
+        # Only the lyrics of displayed songs are decompressed
+        row = None
+        if self._conn is not None:
+            try:
+                with self._db_lock, self._conn:
+                    self._conn.execute("BEGIN")
+                    # Lyrics from a different CSV would not belong to this song
+                    if self.lyrics_current():
+                        row = self._conn.execute(
+                            "SELECT lyrics FROM songs WHERE song_id = ? ORDER BY row LIMIT 1",
+                            (song['song_id'],)
+                        ).fetchone()
+            except sqlite3.Error:
+                # A missing or locked sidecar shouldn't break the results page
+                row = None
+        return dict(song, lyrics=zlib.decompress(row[0]).decode() if row else "")
     
     def get_search_suggestions(self, query_str, max_suggestions=5):
         """Get search suggestions based on partial query"""
         if not query_str or len(query_str) < 2:
             return []
         
-        suggestions = set()
         query_lower = query_str.lower()
+        trigrams = {query_lower[i:i + 3] for i in range(len(query_lower) - 2)}
+        if trigrams and len(self.song_ids) >= self.TRIGRAM_SUGGEST_MIN:
+            return self.get_trigram_suggestions(query_lower, trigrams, max_suggestions)
         
-        for song in self.songs_data:
-            # Check title matches
-            title = song.get("title", "").lower()
-            if query_lower in title:
-                suggestions.add(song.get("title", ""))
-            
-            # Check artist matches  
-            artist = song.get("artist", "").lower()
-            if query_lower in artist:
-                suggestions.add(song.get("artist", ""))
+        # Substring match whole columns at once
+        titles = np.unique(self.titles[np.char.find(self.titles_lc, query_lower) >= 0])
+        artists = np.unique(self.artists[np.char.find(self.artists_lc, query_lower) >= 0])
+        suggestions = list(dict.fromkeys(titles.tolist() + artists.tolist()))
+        return suggestions[:max_suggestions]
+    
+    def get_trigram_suggestions(self, query_lower, trigrams, max_suggestions):
+        """Get suggestions from rows containing every trigram of the query"""
+        suggestions = []
+        candidates = sorted(set.intersection(*[self._trigram_idx.get(t, set()) for t in trigrams]))
+        
+        for idx in candidates:
+            # Check title and artist matches
+            if query_lower in self.titles_lc[idx]:
+                title = self.titles[idx]
+                if title not in suggestions:
+                    suggestions.append(title)
+            if query_lower in self.artists_lc[idx]:
+                artist = self.artists[idx]
+                if artist not in suggestions:
+                    suggestions.append(artist)
+            if len(suggestions) >= max_suggestions:
+                break
         
-        return list(suggestions)[:max_suggestions]
+        return suggestions[:max_suggestions]
 
 def main():
     st.set_page_config(
@@ -184,7 +615,7 @@ def main():
     # Initialize search engine
     if 'search_engine' not in st.session_state:
         with st.spinner("Initializing search engine..."):
-            st.session_state.search_engine = SongSearchEngine()
+            st.session_state.search_engine = SongSearchEngine(in_memory=True)
     
     search_engine = st.session_state.search_engine
     
@@ -201,14 +632,30 @@ def main():
         # Number of results
         max_results = st.slider("Max Results", min_value=1, max_value=50, value=10)
         
+        # Ranking parameters
+        st.subheader("Ranking (BM25):")
+        bm25_k1 = st.slider("k1 (term frequency saturation)", min_value=0.0, max_value=3.0, value=1.5, step=0.1)
+        bm25_b = st.slider("b (length normalization)", min_value=0.0, max_value=1.0, value=0.75, step=0.05)
+        search_engine.set_bm25_params(bm25_k1, bm25_b)
+        
         st.markdown("---")
         st.subheader("Dataset Info")
-        st.info(f"Total Songs: {len(search_engine.songs_data)}")
+        st.info(f"Total Songs: {len(search_engine.song_ids)}")
         
-        # Rebuild index button
+        # Rebuild index buttons; the rebuild runs in the background while searches continue
         if st.button("🔄 Rebuild Index"):
-            with st.spinner("Rebuilding search index..."):
-                search_engine.build_index()
+            search_engine.rebuild_in_background()
+        if st.button("🗜️ Rebuild + Optimize"):
+            search_engine.rebuild_in_background(optimize=True)
+        
+        if search_engine.rebuilding():
+            st.session_state['_rebuilding'] = True
+            st.progress(search_engine.rebuild_progress, text="Rebuilding search index...")
+        elif st.session_state.pop('_rebuilding', False):
+            if search_engine.rebuild_error:
+                st.error(f"Error building index: {search_engine.rebuild_error}")
+            else:
+                st.success("Search index rebuilt successfully!")
     
     # Main search interface
     col1, col2 = st.columns([4, 1])
@@ -223,14 +670,19 @@ def main():
         st.write("")  # Empty space to align button with input
         search_button = st.button("🔍 Search", type="primary")
     
-    # Search suggestions
-    if query and len(query) >= 2:
-        suggestions = search_engine.get_search_suggestions(query)
+    # Search suggestions, recomputed only when the query text changes
+    if query and len(query) >= 3:
+        if st.session_state.get('_last_sugg_q') != query:
+            st.session_state['_last_sugg_q'] = query
+            st.session_state['_last_sugg'] = search_engine.get_search_suggestions(query)
+        suggestions = st.session_state['_last_sugg']
         if suggestions:
             st.markdown("**Suggestions:** " + " • ".join([f"`{s}`" for s in suggestions]))
     
-    # Perform search
-    if query and (search_button or query):
+    # Perform search only once submitted; later reruns for the same query hit the result cache
+    if query and search_button:
+        st.session_state['_last_search_q'] = query
+    if query and query == st.session_state.get('_last_search_q'):
         # Determine search fields
         search_fields = []
         if search_title:
@@ -289,6 +741,11 @@ def main():
     # Footer
     st.markdown("---")
     st.markdown("*Built with Whoosh IR library and Streamlit*")
+    
+    # Poll the background rebuild until it finishes
+    if search_engine.rebuilding():
+        time.sleep(0.5)
+        st.rerun()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file